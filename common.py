@@ -0,0 +1,23 @@
+"""
+common.py
+---------------
+Helpers shared by the NY and multi-state extractors
+
+Author: Tax Automation Team
+"""
+
+import json
+
+from urllib3.util import make_headers
+
+try:
+    import orjson  # Optional, faster JSON parsing and serialization
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:  # pragma: no cover
+    json_loads = json.loads
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Compressed transfer: gzip/deflate always, plus br and zstd when their decoders are installed
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
@@ -12,24 +12,63 @@ Author: Tax Automation Team
 """
 
 import os
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 
-def load_config_from_file(config_file: str = "config.env") -> dict:
-    """Load configuration from .env file"""
+@lru_cache(maxsize=8)
+def _load_config_cached(path: str, mtime_ns: int) -> Mapping[str, str]:
+    """Parse a .env file once per (path, mtime_ns); edits to the file invalidate the entry"""
     config = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    config[key.strip()] = value.strip()
+    
+    # Read-only view so callers cannot mutate the shared cached dict
+    return MappingProxyType(config)
+
+def load_config_from_file(config_file: str = "config.env") -> Mapping[str, str]:
+    """Load configuration from .env file"""
     config_path = Path(config_file)
     
-    if config_path.exists():
-        with open(config_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        config[key.strip()] = value.strip()
+    try:
+        mtime_ns = config_path.stat().st_mtime_ns
+    except OSError:
+        return MappingProxyType({})
+    
+    return _load_config_cached(str(config_path), mtime_ns)
+
+_DEFAULTS = {
+    'GEMINI_API_KEY': None,
+    'GEMINI_MODEL_NAME': 'gemini-2.0-flash',
+}
+
+_RESOLVED: Optional[Dict[str, Optional[str]]] = None
+_RESOLVE_LOCK = threading.Lock()
+
+def _resolve() -> Dict[str, Optional[str]]:
+    """
+    Resolve all settings once per process (environment first, then config.env)
     
-    return config
+    Later calls return the same snapshot without probing the environment
+    or the config file again.
+    """
+    global _RESOLVED
+    if _RESOLVED is None:
+        with _RESOLVE_LOCK:
+            if _RESOLVED is None:
+                config = load_config_from_file()
+                _RESOLVED = {
+                    key: os.getenv(key) or config.get(key, default)
+                    for key, default in _DEFAULTS.items()
+                }
+    return _RESOLVED
 
 def get_gemini_api_key() -> Optional[str]:
     """
@@ -39,25 +78,11 @@ def get_gemini_api_key() -> Optional[str]:
     1. Environment variable GEMINI_API_KEY
     2. config.env file
     """
-    # Try environment variable first
-    api_key = os.getenv('GEMINI_API_KEY')
-    if api_key:
-        return api_key
-    
-    # Try config file
-    config = load_config_from_file()
-    return config.get('GEMINI_API_KEY')
+    return _resolve()['GEMINI_API_KEY']
 
 def get_gemini_model_name() -> str:
     """Get Gemini model name with fallback to default"""
-    # Try environment variable first
-    model_name = os.getenv('GEMINI_MODEL_NAME')
-    if model_name:
-        return model_name
-    
-    # Try config file
-    config = load_config_from_file()
-    return config.get('GEMINI_MODEL_NAME', 'gemini-2.0-flash')
+    return _resolve()['GEMINI_MODEL_NAME']
 
 def validate_config() -> bool:
     """Validate that required configuration is available"""
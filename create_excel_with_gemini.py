@@ -11,150 +11,296 @@ Version 4 (2025-05-26)
 
 from __future__ import annotations
 
-import json
+import codecs
+import hashlib
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from functools import lru_cache
 from typing import Dict, Optional, Tuple
 
 import requests
-from bs4 import BeautifulSoup, Tag
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree, html
 from openpyxl import Workbook
 import google.generativeai as genai
 
+from common import ACCEPT_ENCODING, json_dumps as _json_dumps, json_loads as _json_loads
+
 # ---------------- Gemini Configuration ----------------
 from config_loader import get_gemini_api_key, get_gemini_model_name, validate_config
 
-# Validate configuration first
-if not validate_config():
-    print("[Gemini] Configuration validation failed!")
-    model = None
-    GEMINI_READY = False
-else:
-    try:
-        _GEMINI_KEY = get_gemini_api_key()
-        _MODEL_NAME = get_gemini_model_name()
-        
-        genai.configure(api_key=_GEMINI_KEY)
-        model = genai.GenerativeModel(_MODEL_NAME)
-        GEMINI_READY = True
-        print("[Gemini] API enabled successfully.")
-    except Exception as err:  # pragma: no cover
-        print(f"[Gemini] Failed to enable: {err}, will output raw provisions only.")
-        model = None
-        GEMINI_READY = False
+model = None
+GEMINI_READY = False
+_MODEL_NAME = ""
+_gemini_checked = False
+_gemini_lock = threading.Lock()
+
+def init_gemini() -> bool:
+    """Configure the Gemini client on first call; later calls return the cached outcome."""
+    global model, GEMINI_READY, _MODEL_NAME, _gemini_checked
+    with _gemini_lock:
+        if _gemini_checked:
+            return GEMINI_READY
+        _gemini_checked = True
+
+        # Validate configuration first
+        if not validate_config():
+            print("[Gemini] Configuration validation failed!")
+            return GEMINI_READY
+        try:
+            _GEMINI_KEY = get_gemini_api_key()
+            _MODEL_NAME = get_gemini_model_name()
+            
+            genai.configure(api_key=_GEMINI_KEY)
+            model = genai.GenerativeModel(_MODEL_NAME)
+            GEMINI_READY = True
+            print("[Gemini] API enabled successfully.")
+        except Exception as err:  # pragma: no cover
+            print(f"[Gemini] Failed to enable: {err}, will output raw provisions only.")
+            model = None
+            GEMINI_READY = False
+        return GEMINI_READY
 
 # ---------------- Constants ----------------
 NY_URL = "https://www.tax.ny.gov/bus/ct/def_art9a.htm"
-HEADINGS = {
-    "Entire Net Income Base": "eni",            # Legacy anchor
-    "Business capital base": None,              # No anchor, requires fuzzy matching
-    "Fixed dollar minimum tax": None,
+# Output key -> (tags that carry the section title, lowercase title text, table lookup)
+# "parent": the title is the table's own <caption>; "next": the table follows the title
+SECTIONS: Dict[str, Tuple[Tuple[str, ...], str, str]] = {
+    "Entire Net Income Base": (("caption",), "business income tax rate", "parent"),
+    "Business capital base": (("p",), "business capital base", "next"),
+    "Fixed dollar minimum tax": (("h2",), "fixed dollar minimum tax for general business taxpayers", "next"),
+}
+# Output key -> placeholders for (title not found, table not found, table empty)
+SECTION_PLACEHOLDERS: Dict[str, Tuple[str, str, str]] = {
+    "Entire Net Income Base": (
+        "[ENI table caption not found]", "[ENI caption found but table empty]", "[ENI table empty]"
+    ),
+    "Business capital base": (
+        "[Capital section not found]", "[Capital table not found]", "[Capital table empty]"
+    ),
+    "Fixed dollar minimum tax": (
+        "[FDM heading not found]", "[FDM table not found]", "[FDM table empty]"
+    ),
 }
+# Compiled once: first title tag (in document order) containing the section's text,
+# matched case-insensitively, then its table: the enclosing one or the next one
+_LOWER = "translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+SECTION_TITLE_XPATHS: Dict[str, etree.XPath] = {
+    key: etree.XPath(
+        "(" + " | ".join(f"//{name}" for name in names) + f")[contains({_LOWER}, '{needle}')][1]"
+    )
+    for key, (names, needle, _) in SECTIONS.items()
+}
+TABLE_XPATHS = {
+    "parent": etree.XPath("ancestor::table[1]"),
+    "next": etree.XPath("following::table[1]"),
+}
+
+# Single Gemini prompt covering all three tables; filled in with str.format()
+NY_RATES_PROMPT = """
+Please analyze the following NY State tax table contents for general businesses.
+
+[ENI tax rate table]
+{eni}
+
+[Capital tax rate table]
+{capital}
+
+[FDM tax amount table]
+{fdm}
+
+Please answer:
+1. ENI: What is the tax rate for "All other general business taxpayers"?
+2. Capital: What is the tax rate for "All other general business taxpayers"?
+3. FDM: What are the minimum (should be $25) and maximum tax amounts for general businesses?
+4. For each answer, which table rows did you base this conclusion on? For FDM, also state what type of businesses the table applies to.
+
+Please respond in English with ONLY a JSON object using this structure (use null for a table marked N/A):
+{{
+    "eni_rate": "rate number",
+    "capital_rate": "rate number",
+    "fdm_min": "amount",
+    "fdm_max": "amount",
+    "reasoning": {{
+        "ENI": "specific table row content",
+        "Capital": "specific table row content",
+        "FDM": "business type and the table rows used"
+    }}
+}}
+"""
+
+# charset parameter of a Content-Type header
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+# Dollar amount closing a table line, i.e. the tax column rather than the receipts bracket
+_FDM_RE = re.compile(r"\$(\d[\d,]*)\s*$", re.MULTILINE)
+
+GEMINI_CACHE_DIR = Path("output/.gemini_cache")
+HTTP_CACHE_DIR = Path("output/.http_cache")
+
+# Shared keep-alive session; transient gateway errors are retried with backoff
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "User-Agent": "Mozilla/5.0 (compatible; TaxBot/1.0)",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Encoding": ACCEPT_ENCODING,
+})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])),
+)
 
 # ---------------- Utilities ----------------
-def _clean(text: str | None) -> str:
-    return " ".join(text.split()) if text else ""
+def _cell_text(cell: etree._Element) -> str:
+    """Cell text with each text piece stripped, as BeautifulSoup's get_text(strip=True)."""
+    return "".join(piece.strip() for piece in cell.itertext())
+
+def _table_to_lines(table: etree._Element) -> str:
+    """Flatten a table's <td> rows into "col | col" lines; rows without <td> cells are skipped."""
+    # Only direct children are visited, so nested tables are not merged into this one
+    rows = table.xpath("tr | thead/tr | tbody/tr | tfoot/tr")
+    cols = ([_cell_text(td) for td in row.xpath("td")] for row in rows)
+    return "\n".join(" | ".join(c) for c in cols if c)
+
+# ---------------- Gemini Response Cache ----------------
+def _parse_analysis(text: str) -> Dict:
+    """Parse Gemini's answer into the expected JSON object, raising ValueError otherwise."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.replace("```json", "").replace("```", "").strip()
+    analysis = _json_loads(text)
+    if not isinstance(analysis, dict):
+        raise ValueError(f"expected a JSON object, got {type(analysis).__name__}")
+    return analysis
+
+@lru_cache(maxsize=32)
+def _cached_generate(prompt: str) -> Dict:
+    """Return Gemini's parsed answer, reusing in-memory then on-disk results for identical prompts.
+
+    Only answers that parse into a JSON object are cached, so a malformed one is retried next run.
+    """
+    key = hashlib.sha256(f"{_MODEL_NAME}:{prompt}".encode("utf-8")).hexdigest()
+    cache_file = GEMINI_CACHE_DIR / f"{key}.json"
+    if cache_file.exists():
+        try:
+            return _parse_analysis(_json_loads(cache_file.read_bytes())["text"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # Corrupt entry, fall through and refresh it
+
+    text = model.generate_content(prompt).text
+    analysis = _parse_analysis(text)
+    GEMINI_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_file.write_bytes(_json_dumps({"model": _MODEL_NAME, "text": text}))
+    return analysis
 
 # ---------------- Web Scraping ----------------
-def _find_heading(soup: BeautifulSoup, base: str, anchor: Optional[str]) -> Optional[Tag]:
-    """Find section heading: try anchor first, then synonyms/fuzzy matching."""
-    # 1) anchor
-    if anchor:
-        anchor_tag = soup.find(id=anchor)
-        if anchor_tag:
-            return anchor_tag.find_next(["h2", "h3", "h4"])
-
-    # 2) ENI title new name alias
-    if base.lower().startswith("entire net income"):
-        tag = soup.find(
-            lambda t: t.name in ["h2", "h3", "h4"]
-            and "business income tax rate" in t.get_text().lower()
-        )
-        if tag:
-            return tag
-
-    # 3) Business capital base: contains both business+capital
-    if base.lower().startswith("business capital"):
-        return soup.find(
-            lambda t: t.name in ["h2", "h3", "h4"]
-            and "business" in t.get_text().lower()
-            and "capital" in t.get_text().lower()
-        )
+def _declared_charset(content_type: Optional[str]) -> Optional[str]:
+    """Charset named in a Content-Type header, or None if absent or unknown to Python."""
+    match = _CHARSET_RE.search(content_type or "")
+    if not match:
+        return None
+    try:
+        return codecs.lookup(match.group(1)).name
+    except LookupError:
+        return None
+
+def _fetch_ny_doc() -> etree._Element:
+    """
+    Download and parse NY_URL with a conditional GET, reusing the cached copy on 304 Not Modified.
+
+    The body is streamed: each chunk is fed to the lxml parser and appended to the
+    cache file as it arrives, so the page is never held as one bytes object.
+    """
+    body_file = HTTP_CACHE_DIR / "ny_tax.html"
+    meta_file = HTTP_CACHE_DIR / "ny_tax.headers.json"
+
+    headers: Dict[str, str] = {}
+    meta: Dict[str, Optional[str]] = {}
+    if body_file.exists() and meta_file.exists():
+        try:
+            meta = _json_loads(meta_file.read_bytes())
+        except ValueError:
+            meta = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    resp: requests.Response = _SESSION.get(NY_URL, headers=headers, timeout=20, stream=True)
+    with resp:
+        if resp.status_code == 304:
+            print("[Crawler] Page not modified, using cached copy.")
+            parser = html.HTMLParser(encoding=meta.get("charset"))
+            doc = html.parse(str(body_file), parser).getroot()
+            if doc is None:
+                raise etree.ParserError("cached page is empty")
+            return doc
+        resp.raise_for_status()
 
-    # 4) General exact matching
-    return soup.find(
-        lambda t: t.name in ["h2", "h3", "h4"] and base.lower() in t.get_text().lower()
-    )
+        HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # A declared charset wins over lxml's sniffing of <meta> tags in the bytes
+        charset = _declared_charset(resp.headers.get("Content-Type"))
+        parser = html.HTMLParser(encoding=charset)
+        # Written under a temp name and renamed, so an interrupted download never becomes the cache
+        tmp_file = body_file.with_suffix(".tmp")
+        try:
+            with tmp_file.open("wb") as f:
+                for chunk in resp.iter_content(chunk_size=65536):
+                    parser.feed(chunk)
+                    f.write(chunk)
+            doc = parser.close()
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_file, body_file)
+    meta_file.write_bytes(_json_dumps({
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "charset": charset,
+    }))
+    return doc
 
 def scrape_ny_raw() -> Dict[str, str]:
     print("[Crawler] Scraping NY State provisions...")
-    headers = {"User-Agent": "Mozilla/5.0 (compatible; TaxBot/1.0)"}
     try:
-        resp: requests.Response = requests.get(NY_URL, headers=headers, timeout=20)
-        resp.raise_for_status()
+        doc = _fetch_ny_doc()
     except requests.RequestException as e:
         print(f"[Crawler] Connection failed: {e}")
-        return {k: f"[Scraping failed: {e}]" for k in HEADINGS}
-
-    soup = BeautifulSoup(resp.content, "html.parser")
-
-    Path("output").mkdir(exist_ok=True)
-    Path("output/debug_full_html.html").write_text(soup.prettify(), encoding="utf-8")
+        return {k: f"[Scraping failed: {e}]" for k in SECTIONS}
+    except (etree.ParserError, etree.XMLSyntaxError) as e:
+        print(f"[Crawler] Could not parse page: {e}")
+        return {k: f"[Scraping failed: {e}]" for k in SECTIONS}
+
+    # Full-page dump is for debugging only; set TAX_DEBUG_HTML=1 to enable.
+    # The cached original bytes are copied as-is, no DOM re-serialization.
+    if os.getenv("TAX_DEBUG_HTML"):
+        Path("output").mkdir(exist_ok=True)
+        shutil.copyfile(HTTP_CACHE_DIR / "ny_tax.html", "output/debug_full_html.html")
+
+    # One compiled XPath per section title, another for its table; both run in libxml2
+    tables: Dict[str, Optional[etree._Element]] = {}
+    for key, (_, _, lookup) in SECTIONS.items():
+        titles = SECTION_TITLE_XPATHS[key](doc)
+        if titles:
+            found = TABLE_XPATHS[lookup](titles[0])
+            tables[key] = found[0] if found else None
 
     out: Dict[str, str] = {}
-    
-    # Special handling for ENI: directly find Business income tax rate table
-    eni_caption = soup.find("caption", string=lambda text: text and "Business income tax rate" in text)
-    if eni_caption:
-        eni_table = eni_caption.find_parent("table")
-        if eni_table:
-            buf = []
-            for row in eni_table.find_all("tr"):
-                cols = [td.get_text(strip=True) for td in row.find_all("td")]
-                if cols:
-                    buf.append(" | ".join(cols))
-            out["Entire Net Income Base"] = "\n".join(buf) if buf else "[ENI table empty]"
-        else:
-            out["Entire Net Income Base"] = "[ENI caption found but table empty]"
-    else:
-        out["Entire Net Income Base"] = "[ENI table caption not found]"
-
-    # Handle Business capital base
-    capital_section = soup.find(lambda t: t and t.name == "p" and "business capital base" in t.get_text().lower())
-    if capital_section:
-        # Find next table
-        capital_table = capital_section.find_next("table")
-        if capital_table:
-            buf = []
-            for row in capital_table.find_all("tr"):
-                cols = [td.get_text(strip=True) for td in row.find_all("td")]
-                if cols:
-                    buf.append(" | ".join(cols))
-            out["Business capital base"] = "\n".join(buf) if buf else "[Capital table empty]"
-        else:
-            out["Business capital base"] = "[Capital table not found]"
-    else:
-        out["Business capital base"] = "[Capital section not found]"
-
-    # Handle Fixed dollar minimum tax - only general business taxpayers table
-    fdm_heading = soup.find("h2", string=lambda text: text and "Fixed dollar minimum tax for general business taxpayers" in text)
-    if not fdm_heading:
-        # Try to find any h2 tag containing this text
-        fdm_heading = soup.find(lambda tag: tag.name == "h2" and "Fixed dollar minimum tax for general business taxpayers" in tag.get_text())
-    
-    if fdm_heading:
-        fdm_table = fdm_heading.find_next("table")
-        if fdm_table:
-            buf = []
-            for row in fdm_table.find_all("tr"):
-                cols = [td.get_text(strip=True) for td in row.find_all("td")]
-                if cols:
-                    buf.append(" | ".join(cols))
-            out["Fixed dollar minimum tax"] = "\n".join(buf) if buf else "[FDM table empty]"
-        else:
-            out["Fixed dollar minimum tax"] = "[FDM table not found]"
-    else:
-        out["Fixed dollar minimum tax"] = "[FDM heading not found]"
+    for key, (no_title, no_table, empty) in SECTION_PLACEHOLDERS.items():
+        if key not in tables:
+            out[key] = no_title
+            continue
+        table = tables[key]
+        if table is None:
+            out[key] = no_table
+            continue
+        out[key] = _table_to_lines(table) or empty
 
     print("[Crawler] Provisions scraping completed.")
     return out
@@ -168,120 +314,106 @@ def save_raw_text(raw: Dict[str, str], out_dir: Path) -> None:
     print(f"[TXT] Written to {txt}")
 
 # ---------------- Extract Key Tax Rates using Gemini ----------------
-def derive_rates_with_gemini(raw: Dict[str, str]) -> Tuple[Dict[str, str], str]:
-    """Use Gemini LLM to analyze tax rate content and provide reasoning"""
-    
-    if not GEMINI_READY:
-        # Fallback to original logic
-        return derive_rates_fallback(raw), "[Gemini unavailable, using fallback logic]"
-    
-    reasoning_parts = []
-    result: Dict[str, str] = {}
-    
-    # ENI Analysis
-    eni_content = raw.get("Entire Net Income Base", "")
-    if eni_content and not eni_content.startswith("["):
-        eni_prompt = f"""
-Please analyze the following NY State ENI tax rate table content and find the tax rate for "All other general business taxpayers":
+def _fallback_is_confident(key: str, value: str) -> bool:
+    """True when a derive_rates_fallback() value is a usable answer that Gemini need not confirm."""
+    if "N/A" in value:
+        return False
+    if key == "Fixed dollar minimum tax":
+        return value.startswith("Graduated by revenue")
+    try:
+        float(value.rsplit(" ", 1)[-1].rstrip("%"))
+    except ValueError:
+        return False
+    return True
 
-{eni_content}
+def derive_rates_with_gemini(raw: Dict[str, str]) -> Tuple[Dict[str, str], str]:
+    """
+    Extract key tax rates, asking Gemini only for sections the regex fallback cannot answer
 
-Please answer:
-1. What is the tax rate for "All other general business taxpayers"?
-2. Which table row did you base this conclusion on?
+    Sections the fallback parses cleanly are reported as "[Fallback sufficient]";
+    when the page is unchanged this means no LLM call is made at all.
+    """
+    fallback = derive_rates_fallback(raw)
+    eni_done = _fallback_is_confident("Entire Net Income Base", fallback["Entire Net Income Base"])
+    cap_done = _fallback_is_confident("Business capital base", fallback["Business capital base"])
+    fdm_done = _fallback_is_confident("Fixed dollar minimum tax", fallback["Fixed dollar minimum tax"])
 
-Please respond in English using the following format:
-Tax Rate: [rate number]
-Source: [specific table row content]
-"""
+    eni_content = raw.get("Entire Net Income Base", "")
+    cap_content = raw.get("Business capital base", "")
+    fdm_content = raw.get("Fixed dollar minimum tax", "")
+    eni_ask = not eni_done and bool(eni_content) and not eni_content.startswith("[")
+    cap_ask = not cap_done and bool(cap_content) and not cap_content.startswith("[")
+    fdm_ask = not fdm_done and bool(fdm_content) and not fdm_content.startswith("[")
+
+    analysis: Dict = {}
+    if eni_ask or cap_ask or fdm_ask:
+        if not init_gemini():
+            # Fallback to original logic
+            return fallback, "[Gemini unavailable, using fallback logic]"
+
+        # One request covers every unresolved table; the others are sent as N/A
+        prompt = NY_RATES_PROMPT.format(
+            eni=eni_content if eni_ask else "N/A",
+            capital=cap_content if cap_ask else "N/A",
+            fdm=fdm_content if fdm_ask else "N/A",
+        )
         try:
-            eni_response = model.generate_content(eni_prompt)
-            eni_analysis = eni_response.text.strip()
-            
-            # Extract rate from response
-            if "0.065" in eni_analysis:
-                result["Entire Net Income Base"] = "General business tax rate is 0.065"
-                reasoning_parts.append(f"--- ENI ---\n{eni_analysis}")
-            else:
-                result["Entire Net Income Base"] = "Unable to parse ENI tax rate"
-                reasoning_parts.append(f"--- ENI ---\nGemini analysis failed: {eni_analysis}")
+            analysis = _cached_generate(prompt)
         except Exception as e:
-            result["Entire Net Income Base"] = "Error analyzing ENI with Gemini"
-            reasoning_parts.append(f"--- ENI ---\nGemini error: {e}")
-    else:
+            return fallback, f"[Gemini error: {e}, using fallback logic]"
+
+    notes = analysis.get("reasoning")
+    if not isinstance(notes, dict):
+        notes = {}
+    reasoning_parts = []
+    result: Dict[str, str] = {}
+
+    # ENI Analysis
+    eni_rate = str(analysis.get("eni_rate"))
+    if eni_done:
+        result["Entire Net Income Base"] = fallback["Entire Net Income Base"]
+        reasoning_parts.append(f"--- ENI ---\n[Fallback sufficient] {fallback['Entire Net Income Base']}")
+    elif not eni_ask:
         result["Entire Net Income Base"] = "ENI content empty or error"
         reasoning_parts.append("--- ENI ---\nENI content empty or error")
+    elif "0.065" in eni_rate:
+        result["Entire Net Income Base"] = "General business tax rate is 0.065"
+        reasoning_parts.append(f"--- ENI ---\nTax Rate: {eni_rate}\nSource: {notes.get('ENI')}")
+    else:
+        result["Entire Net Income Base"] = "Unable to parse ENI tax rate"
+        reasoning_parts.append(f"--- ENI ---\nGemini analysis failed: {eni_rate} ({notes.get('ENI')})")
 
     # Capital Analysis
-    cap_content = raw.get("Business capital base", "")
-    if cap_content and not cap_content.startswith("["):
-        cap_prompt = f"""
-Please analyze the following NY State Capital tax rate table content and find the tax rate for "All other general business taxpayers":
-
-{cap_content}
-
-Please answer:
-1. What is the tax rate for "All other general business taxpayers"?
-2. Which table row did you base this conclusion on?
-
-Please respond in English using the following format:
-Tax Rate: [rate number]
-Source: [specific table row content]
-"""
-        try:
-            cap_response = model.generate_content(cap_prompt)
-            cap_analysis = cap_response.text.strip()
-            
-            # Extract rate from response
-            if "0.001875" in cap_analysis:
-                result["Business capital base"] = "General business tax rate is 0.001875"
-                reasoning_parts.append(f"--- Capital ---\n{cap_analysis}")
-            else:
-                result["Business capital base"] = "Unable to parse Capital tax rate"
-                reasoning_parts.append(f"--- Capital ---\nGemini analysis failed: {cap_analysis}")
-        except Exception as e:
-            result["Business capital base"] = "Error analyzing Capital with Gemini"
-            reasoning_parts.append(f"--- Capital ---\nGemini error: {e}")
-    else:
+    cap_rate = str(analysis.get("capital_rate"))
+    if cap_done:
+        result["Business capital base"] = fallback["Business capital base"]
+        reasoning_parts.append(f"--- Capital ---\n[Fallback sufficient] {fallback['Business capital base']}")
+    elif not cap_ask:
         result["Business capital base"] = "Capital content empty or error"
         reasoning_parts.append("--- Capital ---\nCapital content empty or error")
+    elif "0.001875" in cap_rate:
+        result["Business capital base"] = "General business tax rate is 0.001875"
+        reasoning_parts.append(f"--- Capital ---\nTax Rate: {cap_rate}\nSource: {notes.get('Capital')}")
+    else:
+        result["Business capital base"] = "Unable to parse Capital tax rate"
+        reasoning_parts.append(f"--- Capital ---\nGemini analysis failed: {cap_rate} ({notes.get('Capital')})")
 
     # FDM Analysis
-    fdm_content = raw.get("Fixed dollar minimum tax", "")
-    if fdm_content and not fdm_content.startswith("["):
-        fdm_prompt = f"""
-Please analyze the following NY State FDM tax rate table content and find the tax amount range for general businesses:
-
-{fdm_content}
-
-Please answer:
-1. What is the minimum tax amount? (should be $25)
-2. What is the maximum tax amount?
-3. What type of businesses does this table apply to?
-
-Please respond in English using the following format:
-Minimum Tax: [amount]
-Maximum Tax: [amount]
-Business Type: [type description]
-Source: [explain which table rows you based this on]
-"""
-        try:
-            fdm_response = model.generate_content(fdm_prompt)
-            fdm_analysis = fdm_response.text.strip()
-            
-            # Extract range from response
-            if "$25" in fdm_analysis and ("$200,000" in fdm_analysis or "$200000" in fdm_analysis):
-                result["Fixed dollar minimum tax"] = "Graduated by revenue, ranging from $25 to $200,000"
-                reasoning_parts.append(f"--- FDM ---\n{fdm_analysis}")
-            else:
-                result["Fixed dollar minimum tax"] = "Unable to correctly parse FDM range"
-                reasoning_parts.append(f"--- FDM ---\nGemini analysis result: {fdm_analysis}")
-        except Exception as e:
-            result["Fixed dollar minimum tax"] = "Error analyzing FDM with Gemini"
-            reasoning_parts.append(f"--- FDM ---\nGemini error: {e}")
-    else:
+    fdm_min = str(analysis.get("fdm_min"))
+    fdm_max = str(analysis.get("fdm_max"))
+    fdm_analysis = f"Minimum Tax: {fdm_min}\nMaximum Tax: {fdm_max}\nSource: {notes.get('FDM')}"
+    if fdm_done:
+        result["Fixed dollar minimum tax"] = fallback["Fixed dollar minimum tax"]
+        reasoning_parts.append(f"--- FDM ---\n[Fallback sufficient] {fallback['Fixed dollar minimum tax']}")
+    elif not fdm_ask:
         result["Fixed dollar minimum tax"] = "FDM content empty or error"
         reasoning_parts.append("--- FDM ---\nFDM content empty or error")
+    elif fdm_min.replace("$", "").strip() == "25" and fdm_max.replace("$", "").replace(",", "").strip() == "200000":
+        result["Fixed dollar minimum tax"] = "Graduated by revenue, ranging from $25 to $200,000"
+        reasoning_parts.append(f"--- FDM ---\n{fdm_analysis}")
+    else:
+        result["Fixed dollar minimum tax"] = "Unable to correctly parse FDM range"
+        reasoning_parts.append(f"--- FDM ---\nGemini analysis result: {fdm_analysis}")
 
     reasoning = "\n\n".join(reasoning_parts)
     return result, reasoning
@@ -307,16 +439,10 @@ def derive_rates_fallback(raw: Dict[str, str]) -> Dict[str, str]:
     result["Business capital base"] = f"General business tax rate is {cap_rate}"
 
     # FDM range (only ≥$25)
-    fdm_lines = [l for l in raw.get("Fixed dollar minimum tax", "").split("\n") if "$" in l]
-    amounts: list[int] = []
-    for line in fdm_lines:
-        for part in line.split("$")[1:]:
-            num = part.replace(",", "").strip()
-            if num.isdigit():
-                amounts.append(int(num))
+    amounts = [int(m.replace(",", "")) for m in _FDM_RE.findall(raw.get("Fixed dollar minimum tax", ""))]
     nums = sorted(n for n in amounts if n >= 25)
     if nums:
-        result["Fixed dollar minimum tax"] = f"Graduated by revenue, ranging from ${nums[0]} to ${nums[-1]}"
+        result["Fixed dollar minimum tax"] = f"Graduated by revenue, ranging from ${nums[0]:,} to ${nums[-1]:,}"
     else:
         result["Fixed dollar minimum tax"] = raw.get("Fixed dollar minimum tax", "N/A")
 
@@ -332,9 +458,23 @@ def save_reasoning(reasoning: str, out_dir: Path) -> None:
 
 # ---------------- Excel Export ----------------
 def create_excel(data: Dict[str, str], out_dir: Path) -> None:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "NY Tax Summary"
+    # Skip the export when the data matches the last workbook and that file still exists
+    digest = hashlib.sha256(repr(sorted(data.items())).encode("utf-8")).hexdigest()
+    hash_file = out_dir / ".last_excel_hash"
+    try:
+        last = _json_loads(hash_file.read_bytes())
+    except (OSError, ValueError):
+        last = {}
+    if not isinstance(last, dict):
+        last = {}
+    last_file = last.get("file")
+    if last.get("hash") == digest and isinstance(last_file, str) and (out_dir / last_file).is_file():
+        print(f"[Excel] Unchanged, skipped (latest: {out_dir / last_file})")
+        return
+
+    # Write-only mode streams rows straight to the file instead of keeping Cell objects
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("NY Tax Summary")
     ws.append(
         [
             "State",
@@ -363,6 +503,7 @@ def create_excel(data: Dict[str, str], out_dir: Path) -> None:
     )
     fp = out_dir / f"ny_tax_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     wb.save(fp)
+    hash_file.write_bytes(_json_dumps({"hash": digest, "file": fp.name}))
     print(f"[Excel] Exported to {fp}")
 
 # ---------------- Main Function ----------------
@@ -370,8 +511,12 @@ def main() -> None:
     out_dir = Path("output")
     out_dir.mkdir(exist_ok=True)
 
-    raw = scrape_ny_raw()
-    save_raw_text(raw, out_dir)
+    # Configure Gemini on a worker thread while the page is being downloaded
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        gemini_init = pool.submit(init_gemini)
+        raw = scrape_ny_raw()
+        save_raw_text(raw, out_dir)
+        gemini_init.result()
 
     summarized, reasoning = derive_rates_with_gemini(raw)
     save_reasoning(reasoning, out_dir)
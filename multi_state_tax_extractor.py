@@ -16,21 +16,81 @@ Version: 1.0 (2025-05-26)
 
 from __future__ import annotations
 
+import copy
+import hashlib
 import json
+import math
+import os
+import re
+import string
+import tempfile
+import threading
+import time
 import yaml
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Any
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from enum import Enum
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-from openpyxl.worksheet.hyperlink import Hyperlink
 import google.generativeai as genai
 
+from common import ACCEPT_ENCODING, json_dumps as _json_dumps, json_loads as _json_loads
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml-backed, much faster
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    import trafilatura  # Optional, main-text extraction for denser LLM input
+except ImportError:  # pragma: no cover
+    trafilatura = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser  # Optional, C parser used before bs4
+except ImportError:  # pragma: no cover
+    LexborHTMLParser = None
+
+# Upper bound on states scraped/analyzed concurrently
+MAX_WORKERS = 8
+
+# States analyzed per LLM request (each block is at most MAX_DISTILLED_CHARS of content)
+BATCH_SIZE = 8
+
+# (connect, read) seconds: an unreachable host fails fast, a slow page still gets time
+REQUEST_TIMEOUT = (5, 30)
+
+# Scraped pages are kept here for conditional GETs across runs
+HTTP_CACHE_DIR = Path("multi_state_output/.http_cache")
+
+# Last good analysis per state, reused while the scraped text is unchanged
+STATE_CACHE_DIR = Path("multi_state_output/state_cache")
+STATE_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Gemini responses, keyed by sha256(model name + prompt); they expire with the
+# state analyses, so an analysis past its TTL is really asked of Gemini again
+LLM_CACHE_DIR = Path("multi_state_output/.llm_cache")
+LLM_CACHE_TTL = STATE_CACHE_TTL  # seconds
+
+# Opt-in reuse of a state's analysis when its page text is nearly unchanged
+SEMANTIC_CACHE_DIR = STATE_CACHE_DIR / "semantic"
+# A near-match is never trusted for longer than an exact one
+SEMANTIC_CACHE_TTL = STATE_CACHE_TTL  # seconds
+SEMANTIC_THRESHOLD = 0.98  # cosine similarity
+EMBEDDING_MODEL = "models/text-embedding-004"
+
 # ---------------- Configuration Models ----------------
 
 class TaxType(Enum):
@@ -69,73 +129,22 @@ class StateConfig:
     nexus_effective_date: str = "unknown"
     sales_factor_method: str = "market base"
     sales_factor_date: str = "unknown"
-
-# ---------------- LLM Analysis Engine ----------------
-
-class TaxAnalysisEngine:
-    """Unified LLM engine for analyzing tax content across states"""
     
-    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash"):
-        try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(model_name)
-            self.available = True
-            print(f"[LLM Engine] Successfully initialized with {model_name}")
-        except Exception as e:
-            print(f"[LLM Engine] Failed to initialize: {e}")
-            self.model = None
-            self.available = False
+    # Derived: entity type as shown in prompts and exports (e.g. "C-corp")
+    entity_display: str = field(init=False, repr=False)
     
-    def analyze_tax_content(self, content: str, state_name: str, config: StateConfig) -> Tuple[Dict[str, str], str]:
-        """
-        Analyze raw HTML/text content and extract tax rates using LLM
-        
-        Returns:
-            - Dict: Extracted tax information
-            - str: Reasoning process
-        """
-        if not self.available:
-            return {}, "[LLM not available]"
-        
-        # Build industry-specific context
-        industry_context = ""
-        if config.industry == "shipping":
-            industry_context = """
-INDUSTRY CONTEXT: This analysis is for a SHIPPING/MARINE TRANSPORTATION company.
-- Look for any special rates, exemptions, or rules for water transportation, marine services, or shipping companies
-- Note any tonnage taxes, port fees, or maritime-specific tax structures
-- Identify if standard corporate rates apply or if there are industry-specific overrides
-"""
-        
-        # Build entity-specific context
-        entity_context = ""
-        if config.entity_type == "C_corp":
-            entity_context = """
-ENTITY TYPE: This is for a C-CORPORATION (regular corporation).
-- Focus ONLY on rates applicable to C-corporations
-- IGNORE any rules for S-corporations, LLCs, partnerships, sole proprietorships
-- IGNORE special rules for banks, insurance companies, utilities, or REITs
-- Look for rates applicable to "general business taxpayers" or "all other corporations"
-"""
-
-        # Determine which fields to extract
-        included_fields = config.included_fields or ["ENI", "FDM", "Capital"]
-        fields_instruction = f"Focus on extracting these specific tax components: {', '.join(included_fields)}"
+    def __post_init__(self):
+        self.entity_display = self.entity_type.replace('_', '-')
 
-        # Check if this is NY (use detailed descriptions) or other states (use comprehensive JSON)
-        if state_name.lower() == "new york":
-            # NY specific prompt for detailed descriptions
-            prompt = f"""
-You are a tax analysis expert specializing in {config.entity_type.replace('_', '-')} taxation in the {config.industry} industry.
-
-{entity_context}
-{industry_context}
+# ---------------- Prompt Templates ----------------
 
+# Per-state prompts; the shared entity/industry preamble is sent as the system instruction
+NY_PROMPT = string.Template("""
 CONTENT TO ANALYZE:
-{content[:8000]}  # Limit content size
+$content
 
 EXTRACTION REQUIREMENTS:
-{fields_instruction}
+$fields_instruction
 
 1. ENI (Entire Net Income): Standard corporate income tax rate
 2. FDM (Fixed Dollar Minimum): Minimum tax amounts or ranges
@@ -143,7 +152,7 @@ EXTRACTION REQUIREMENTS:
 
 OUTPUT FORMAT:
 Please respond in JSON format with this structure:
-{{
+{
     "ENI_description": "Complete sentence describing ENI tax rates with full context and conditions, or N/A",
     "FDM_description": "Complete sentence describing FDM tax amounts with ranges and conditions, or N/A", 
     "Capital_description": "Complete sentence describing Capital tax rates with limits and conditions, or N/A",
@@ -151,7 +160,7 @@ Please respond in JSON format with this structure:
     "reasoning": "Brief technical analysis summary",
     "confidence": "high/medium/low",
     "source_sections": ["list of HTML sections or table names used"]
-}}
+}
 
 DESCRIPTION REQUIREMENTS:
 - ENI_description: Include the exact tax rate(s), thresholds, and conditions
@@ -159,25 +168,19 @@ DESCRIPTION REQUIREMENTS:
 - Capital_description: Include the rate and any limits
 - Each description should be a complete, client-friendly sentence that can stand alone
 
-CRITICAL: Only include rates that apply to {config.entity_type.replace('_', '-')}s in {config.industry}.
+CRITICAL: Only include rates that apply to ${entity}s in $industry.
 If no specific information is found, mark as "N/A" and explain why in reasoning.
-"""
-        else:
-            # Other states: comprehensive JSON for user review
-            prompt = f"""
-You are a tax analysis expert specializing in {config.entity_type.replace('_', '-')} taxation in the {config.industry} industry.
-
-{entity_context}
-{industry_context}
+""")
 
+OTHER_PROMPT = string.Template("""
 CONTENT TO ANALYZE:
-{content[:8000]}  # Limit content size
+$content
 
-Please extract ALL available tax information for {state_name} state that applies to {config.entity_type.replace('_', '-')}s in {config.industry}.
+Please extract ALL available tax information for $state_name state that applies to ${entity}s in $industry.
 
 OUTPUT FORMAT:
 Please respond in JSON format with this structure:
-{{
+{
     "corporate_income_tax": "Rate and description or N/A",
     "franchise_tax": "Rate and description or N/A",
     "minimum_tax": "Amount/range and description or N/A",
@@ -192,73 +195,401 @@ Please respond in JSON format with this structure:
     "reasoning": "Summary of analysis and what tax structures apply",
     "confidence": "high/medium/low",
     "source_sections": ["list of HTML sections or table names used"]
-}}
+}
 
 CRITICAL: Include ALL relevant tax information found, even if it doesn't fit standard categories.
 Mark items as "N/A" only if truly not found or not applicable.
+""")
+
+# Several states in one request; each block carries its own per-state prompt
+BATCH_PROMPT = string.Template("""
+You will analyze the tax pages of $count states. Each block below starts with
+"=== STATE: <state code> ===" followed by the instructions and content for that state.
+
+$blocks
+
+OUTPUT FORMAT:
+Respond with ONE JSON object keyed by state code, for example {"NY": {...}, "CA": {...}}.
+Each value must follow the JSON structure requested inside that state's block.
+""")
+
+# Characters of scraped content included in each prompt
+MAX_CONTENT_CHARS = 8000
+
+# Leading ```json / ``` and trailing ``` fences around a model's JSON answer
+_FENCE_RE = re.compile(r"\A\s*```(?:json)?\s*|\s*```\s*\Z")
+
+class _JsonObjectTracker:
+    """Follows streamed text and reports when the first top-level JSON object has closed"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, chunk: str) -> bool:
+        """Consume `chunk`; True once the object's closing brace has been seen"""
+        for ch in chunk:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif not self.started:
+                continue  # Preamble such as a ```json fence
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+# Lines worth sending to the LLM: percentages, dollar amounts, decimal rates, rate wording
+_TAX_LINE_RE = re.compile(r"\d+(?:\.\d+)?\s*%|\$\s*\d|\b\d*\.\d+\b|tax\s+rate|net\s+income\s+base", re.I)
+
+# Characters of distilled content included in each prompt
+MAX_DISTILLED_CHARS = 4000
+
+@lru_cache(maxsize=32)
+def _hint_re(keywords: Tuple[str, ...]) -> Optional[re.Pattern]:
+    """Case-insensitive alternation of a state's hint keywords"""
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(k) for k in keywords), re.I)
+
+def _distill(content: str, hints: Optional[Dict[str, Any]]) -> str:
+    """
+    Keep only the lines of scraped text that look like tax content
+    
+    A line is kept if it matches _TAX_LINE_RE or one of the state's
+    extraction_hints keywords, together with one line of context on either
+    side (table labels sit next to their values). Pages where nothing
+    matches are sent as before, cut to MAX_CONTENT_CHARS.
+    """
+    keywords = tuple(
+        k for name, values in (hints or {}).items()
+        if name.endswith("keywords") and isinstance(values, list)
+        for k in values if isinstance(k, str)
+    )
+    hint_re = _hint_re(keywords)
+    
+    lines = [line.strip() for line in content.splitlines()]
+    lines = [line for line in lines if line]
+    keep = set()
+    for i, line in enumerate(lines):
+        if _TAX_LINE_RE.search(line) or (hint_re is not None and hint_re.search(line)):
+            keep.update((i - 1, i, i + 1))
+    if not keep:
+        return content[:MAX_CONTENT_CHARS]
+    
+    return "\n".join(lines[i] for i in sorted(keep) if 0 <= i < len(lines))[:MAX_DISTILLED_CHARS]
+
+@lru_cache(maxsize=64)
+def _load_config_data(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse a YAML or JSON state config once per (path, mtime_ns)"""
+    with open(path, 'r') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            return yaml.load(f, Loader=_YamlLoader)
+        return _json_loads(f.read())
+
+# ---------------- Result Cache ----------------
+
+class ExtractionCache:
+    """JSON entries on disk, one file per key, written atomically"""
+    
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+    
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Stored entry for `key`, or None if missing, unreadable or older than `max_age` seconds"""
+        try:
+            entry = _json_loads((self.cache_dir / f"{key}.json").read_bytes())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict):
+            return None
+        if max_age is not None:
+            ts = entry.get("ts")
+            if not isinstance(ts, (int, float)) or time.time() - ts > max_age:
+                return None
+        return entry
+    
+    def put(self, key: str, entry: Dict[str, Any]):
+        """Store `entry` under `key`, replacing any previous one"""
+        # Write to a temp file then rename, so concurrent readers never see a partial entry
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+            tmp.write(_json_dumps(entry))
+        os.replace(tmp.name, self.cache_dir / f"{key}.json")
+
+# Rates and amounts ("6.5%", "$25", "0.001875"); bare years and counts are not included
+_FIGURE_RE = re.compile(r"\$\s*\d[\d,]*(?:\.\d+)?|\d+(?:\.\d+)?\s*%|\b\d*\.\d+\b")
+
+class SemanticCache:
+    """
+    Reuse a state's previous analysis when its page text is nearly the same
+    
+    An entry matches when the new text's embedding is within `threshold`
+    cosine similarity of the stored one and the page states exactly the same
+    rates and dollar amounts, so rewording (or a new year in a heading) still
+    hits while any changed figure forces a fresh analysis.
+    """
+    
+    def __init__(self, cache: ExtractionCache, embed: Callable[[str], Optional[List[float]]],
+                 threshold: float = SEMANTIC_THRESHOLD, ttl: float = SEMANTIC_CACHE_TTL):
+        self.cache = cache
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+    
+    @staticmethod
+    def _figures(text: str) -> List[str]:
+        return sorted({re.sub(r"\s+", "", m) for m in _FIGURE_RE.findall(text)})
+    
+    @staticmethod
+    def _cosine(a: List[float], b: List[float]) -> float:
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+    
+    def get(self, key: str, text: str) -> Optional[Dict[str, Any]]:
+        """Stored entry if `text` is a near-duplicate of the text it was made from"""
+        entry = self.cache.get(key, max_age=self.ttl)
+        if entry is None:
+            return None
+        if entry.get("figures") != self._figures(text):
+            return None
+        vector = self.embed(text)
+        if not vector or self._cosine(vector, entry.get("embedding") or []) < self.threshold:
+            return None
+        return entry
+    
+    def put(self, key: str, text: str, entry: Dict[str, Any]):
+        """Store `entry` along with what get() compares against"""
+        vector = self.embed(text)
+        if vector:
+            self.cache.put(key, {**entry, "embedding": vector, "figures": self._figures(text)})
+
+# ---------------- LLM Analysis Engine ----------------
+
+class TaxAnalysisEngine:
+    """Unified LLM engine for analyzing tax content across states"""
+    
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash",
+                 enable_cache: bool = True, cache_dir: Optional[Path] = LLM_CACHE_DIR):
+        self.model_name = model_name
+        # Responses are cached per prompt: in memory for this run, and on disk across runs
+        self.cache = ExtractionCache(cache_dir) if enable_cache and cache_dir is not None else None
+        self._generate = lru_cache(maxsize=256)(self._generate_uncached) if enable_cache else self._generate_uncached
+        # Looked up and stored for the same page text, so embed it only once
+        self.embed = lru_cache(maxsize=64)(self._embed_uncached)
+        # One model per shared preamble (system instruction), see _model_for()
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+        try:
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(model_name)
+            self.available = True
+            print(f"[LLM Engine] Successfully initialized with {model_name}")
+        except Exception as e:
+            print(f"[LLM Engine] Failed to initialize: {e}")
+            self.model = None
+            self.available = False
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _shared_preamble(entity_type: str, industry: str) -> str:
+        """
+        Instructions that depend only on entity type and industry (built once per pair)
+        
+        They are identical for every state in a run, so they are sent as the
+        model's system instruction instead of being repeated inside each prompt.
+        This keeps the per-state request to the content and output format, and
+        gives Gemini a stable prefix for its implicit prompt caching.
+        """
+        # Build industry-specific context
+        industry_context = ""
+        if industry == "shipping":
+            industry_context = """
+INDUSTRY CONTEXT: This analysis is for a SHIPPING/MARINE TRANSPORTATION company.
+- Look for any special rates, exemptions, or rules for water transportation, marine services, or shipping companies
+- Note any tonnage taxes, port fees, or maritime-specific tax structures
+- Identify if standard corporate rates apply or if there are industry-specific overrides
+"""
+        
+        # Build entity-specific context
+        entity_context = ""
+        if entity_type == "C_corp":
+            entity_context = """
+ENTITY TYPE: This is for a C-CORPORATION (regular corporation).
+- Focus ONLY on rates applicable to C-corporations
+- IGNORE any rules for S-corporations, LLCs, partnerships, sole proprietorships
+- IGNORE special rules for banks, insurance companies, utilities, or REITs
+- Look for rates applicable to "general business taxpayers" or "all other corporations"
 """
         
+        return f"""
+You are a tax analysis expert specializing in {entity_type.replace('_', '-')} taxation in the {industry} industry.
+
+{entity_context}
+{industry_context}
+"""
+    
+    def _model_for(self, preamble: str):
+        """GenerativeModel carrying `preamble` as its system instruction, created once"""
+        with self._models_lock:
+            model = self._models.get(preamble)
+            if model is None:
+                model = genai.GenerativeModel(self.model_name, system_instruction=preamble)
+                self._models[preamble] = model
+            return model
+    
+    def _cache_key(self, preamble: str, prompt: str) -> str:
+        return hashlib.sha256(f"{self.model_name}:{preamble}:{prompt}".encode("utf-8")).hexdigest()
+    
+    def _generate_uncached(self, preamble: str, prompt: str) -> Tuple[str, bool]:
+        """
+        Return the model's response text, consulting the on-disk cache first
+        
+        Returns:
+            - str: Response text
+            - bool: True if it came from the on-disk cache
+        """
+        if self.cache is not None:
+            entry = self.cache.get(self._cache_key(preamble, prompt), max_age=LLM_CACHE_TTL)
+            if entry is not None and isinstance(entry.get("text"), str):
+                return entry["text"], True
+        return self._stream_text(preamble, prompt), False
+    
+    def _remember_text(self, preamble: str, prompt: str, text: str):
+        """Store a fresh response that parsed, so later runs can skip the request"""
+        if self.cache is not None:
+            self.cache.put(self._cache_key(preamble, prompt),
+                           {"model": self.model_name, "text": text, "ts": time.time()})
+    
+    def _stream_text(self, preamble: str, prompt: str) -> str:
+        """Stream the response, stopping as soon as its JSON object has closed"""
+        tracker = _JsonObjectTracker()
+        parts = []
+        for chunk in self._model_for(preamble).generate_content(prompt, stream=True):
+            parts.append(chunk.text)
+            if tracker.feed(chunk.text):
+                break  # Anything after the object (closing fence, chatter) is discarded anyway
+        return "".join(parts)
+    
+    def _embed_uncached(self, text: str) -> Optional[List[float]]:
+        """Embedding of the (truncated) text, or None if the LLM is unavailable or fails"""
+        if not self.available:
+            return None
         try:
-            response = self.model.generate_content(prompt)
-            analysis_text = response.text.strip()
+            return genai.embed_content(model=EMBEDDING_MODEL, content=text[:MAX_CONTENT_CHARS])["embedding"]
+        except Exception as e:
+            print(f"[LLM Engine] Embedding failed: {e}")
+            return None
+    
+    def _build_prompt(self, content: str, state_name: str, config: StateConfig) -> str:
+        """Fill in the per-state prompt template"""
+        # Determine which fields to extract
+        included_fields = config.included_fields or ["ENI", "FDM", "Capital"]
+        fields_instruction = f"Focus on extracting these specific tax components: {', '.join(included_fields)}"
+
+        # Check if this is NY (use detailed descriptions) or other states (use comprehensive JSON)
+        template = NY_PROMPT if state_name.lower() == "new york" else OTHER_PROMPT
+        return template.substitute(
+            content=_distill(content, config.extraction_hints),
+            state_name=state_name,
+            entity=config.entity_display,
+            industry=config.industry,
+            fields_instruction=fields_instruction,
+        )
+    
+    def _interpret_analysis(self, analysis_data: Dict[str, Any], state_name: str,
+                            config: StateConfig) -> Tuple[Dict[str, str], str]:
+        """Turn one state's parsed JSON answer into (result, reasoning log)"""
+        reasoning = analysis_data.get("reasoning", "No reasoning provided")
+        confidence = analysis_data.get("confidence", "unknown")
+        
+        if state_name.lower() == "new york":
+            # NY specific processing - detailed descriptions
+            eni_desc = analysis_data.get("ENI_description", "N/A")
+            fdm_desc = analysis_data.get("FDM_description", "N/A") 
+            capital_desc = analysis_data.get("Capital_description", "N/A")
+            shipping_rule = analysis_data.get("shipping_special_rule", "N/A")
             
-            # Clean up JSON response - remove markdown formatting if present
-            if analysis_text.startswith("```json"):
-                analysis_text = analysis_text.replace("```json", "").replace("```", "").strip()
-            elif analysis_text.startswith("```"):
-                analysis_text = analysis_text.replace("```", "").strip()
+            # Build result based on included fields - using full descriptions
+            included_fields = config.included_fields or ["ENI", "FDM", "Capital"]
+            result = {}
             
-            # Try to parse JSON response
-            try:
-                analysis_data = json.loads(analysis_text)
-                reasoning = analysis_data.get("reasoning", "No reasoning provided")
-                confidence = analysis_data.get("confidence", "unknown")
-                
-                if state_name.lower() == "new york":
-                    # NY specific processing - detailed descriptions
-                    eni_desc = analysis_data.get("ENI_description", "N/A")
-                    fdm_desc = analysis_data.get("FDM_description", "N/A") 
-                    capital_desc = analysis_data.get("Capital_description", "N/A")
-                    shipping_rule = analysis_data.get("shipping_special_rule", "N/A")
-                    
-                    # Build result based on included fields - using full descriptions
-                    included_fields = config.included_fields or ["ENI", "FDM", "Capital"]
-                    result = {}
-                    
-                    if "ENI" in included_fields and eni_desc != "N/A":
-                        result["ENI (Entire Net Income)"] = eni_desc
-                    if "FDM" in included_fields and fdm_desc != "N/A":
-                        result["FDM (Fixed Dollar Minimum)"] = fdm_desc
-                    if "Capital" in included_fields and capital_desc != "N/A":
-                        result["Capital (Business Capital Base)"] = capital_desc
-                    
-                    # Format enhanced reasoning log
-                    reasoning_log = f"""--- {state_name} Analysis ---
+            if "ENI" in included_fields and eni_desc != "N/A":
+                result["ENI (Entire Net Income)"] = eni_desc
+            if "FDM" in included_fields and fdm_desc != "N/A":
+                result["FDM (Fixed Dollar Minimum)"] = fdm_desc
+            if "Capital" in included_fields and capital_desc != "N/A":
+                result["Capital (Business Capital Base)"] = capital_desc
+            
+            # Format enhanced reasoning log
+            reasoning_log = f"""--- {state_name} Analysis ---
 ENI: {eni_desc}
 FDM: {fdm_desc}
 Capital: {capital_desc}
 Special shipping rule: {shipping_rule}
 Reasoning: {reasoning}
 Confidence: {confidence}"""
-                    
-                else:
-                    # Other states - comprehensive JSON data for user review
-                    result = {}
-                    json_data_parts = []
-                    
-                    # Include all non-N/A tax information
-                    for key, value in analysis_data.items():
-                        if key not in ["reasoning", "confidence", "source_sections"] and value != "N/A":
-                            result[key] = value
-                            json_data_parts.append(f"{key}: {value}")
-                    
-                    # Format reasoning log with all data
-                    reasoning_log = f"""--- {state_name} Analysis ---
+            
+        else:
+            # Other states - comprehensive JSON data for user review
+            result = {}
+            json_data_parts = []
+            
+            # Include all non-N/A tax information
+            for key, value in analysis_data.items():
+                if key not in ["reasoning", "confidence", "source_sections"] and value != "N/A":
+                    result[key] = value
+                    json_data_parts.append(f"{key}: {value}")
+            
+            # Format reasoning log with all data
+            reasoning_log = f"""--- {state_name} Analysis ---
 {chr(10).join(json_data_parts)}
 Reasoning: {reasoning}
 Confidence: {confidence}"""
-                
-                return result, reasoning_log
+        
+        return result, reasoning_log
+    
+    def analyze_tax_content(self, content: str, state_name: str, config: StateConfig) -> Tuple[Dict[str, str], str]:
+        """
+        Analyze raw HTML/text content and extract tax rates using LLM
+        
+        Returns:
+            - Dict: Extracted tax information
+            - str: Reasoning process
+        """
+        if not self.available:
+            return {}, "[LLM not available]"
+        
+        preamble = self._shared_preamble(config.entity_type, config.industry)
+        prompt = self._build_prompt(content, state_name, config)
+        
+        try:
+            response_text, from_cache = self._generate(preamble, prompt)
+            
+            # Clean up JSON response - remove markdown formatting if present
+            analysis_text = _FENCE_RE.sub("", response_text.strip())
+            
+            # Try to parse JSON response
+            try:
+                analysis_data = _json_loads(analysis_text)
+                if not isinstance(analysis_data, dict):
+                    raise json.JSONDecodeError("expected a JSON object", analysis_text, 0)
+                # Only answers worth replaying: parsed, and not marked low-confidence
+                if not from_cache and analysis_data.get("confidence") != "low":
+                    self._remember_text(preamble, prompt, response_text)
+                return self._interpret_analysis(analysis_data, state_name, config)
                 
             except json.JSONDecodeError:
                 # Fallback: treat as plain text
@@ -266,17 +597,139 @@ Confidence: {confidence}"""
                 
         except Exception as e:
             return {}, f"--- {state_name} Analysis ---\nLLM Error: {e}"
+    
+    def analyze_tax_content_batch(self, items: List[Tuple[str, str, StateConfig]]) -> List[Tuple[Dict[str, str], str]]:
+        """
+        Analyze several states with one LLM request
+        
+        `items` are (content, state_name, config) tuples, as for analyze_tax_content.
+        States sharing an entity type and industry go into one prompt that asks
+        for a JSON object keyed by state code. Any state the answer does not
+        cover (or a batch that fails to parse) is retried with analyze_tax_content.
+        
+        Returns:
+            - List of (result, reasoning) in the same order as `items`
+        """
+        if not self.available:
+            return [({}, "[LLM not available]") for _ in items]
+        
+        outcomes: List[Optional[Tuple[Dict[str, str], str]]] = [None] * len(items)
+        
+        # One request per shared preamble, since it is sent as the system instruction
+        groups: Dict[str, List[int]] = {}
+        for index, (_, _, config) in enumerate(items):
+            groups.setdefault(self._shared_preamble(config.entity_type, config.industry), []).append(index)
+        
+        for preamble, indexes in groups.items():
+            if len(indexes) == 1:
+                continue  # Single state: the regular prompt below is cheaper
+            blocks = []
+            for index in indexes:
+                content, state_name, config = items[index]
+                prompt = self._build_prompt(content, state_name, config)
+                blocks.append(f"=== STATE: {config.state_code} ===\n{prompt}")
+            prompt = BATCH_PROMPT.substitute(count=len(indexes), blocks="\n".join(blocks))
+            
+            try:
+                response_text, from_cache = self._generate(preamble, prompt)
+                batch_data = _json_loads(_FENCE_RE.sub("", response_text.strip()))
+            except Exception as e:
+                print(f"[LLM Engine] Batch of {len(indexes)} states failed ({e}), analyzing one by one")
+                continue
+            if not isinstance(batch_data, dict):
+                continue
+            if not from_cache and not any(
+                isinstance(answer, dict) and answer.get("confidence") == "low" for answer in batch_data.values()
+            ):
+                self._remember_text(preamble, prompt, response_text)
+            
+            for index in indexes:
+                _, state_name, config = items[index]
+                analysis_data = batch_data.get(config.state_code)
+                if isinstance(analysis_data, dict):
+                    outcomes[index] = self._interpret_analysis(analysis_data, state_name, config)
+        
+        # Per-state requests for anything the batch did not answer
+        for index, outcome in enumerate(outcomes):
+            if outcome is None:
+                outcomes[index] = self.analyze_tax_content(*items[index])
+        
+        return outcomes
 
 # ---------------- Web Scraping Engine ----------------
 
+# Common main-content containers, matched as a single selector group
+CONTENT_SELECTORS = (
+    "main",
+    "[role='main']",
+    ".main-content",
+    ".content",
+    "#content",
+    ".tax-content"
+)
+
+# Only these subtrees are built when parsing; every content selector above
+# lives in one of them on the state sites we scrape
+CONTENT_PARSE_TAGS = ["main", "article", "section", "div"]
+
+# Dropped, with their contents, before the page text is taken
+UNWANTED_TAGS = ["script", "style", "nav", "footer", "header"]
+
+# Unwanted tags are parsed too, so containers inside them stay nested under
+# them and are dropped with them instead of surfacing as top-level matches
+CONTENT_STRAINER = SoupStrainer(CONTENT_PARSE_TAGS + UNWANTED_TAGS)
+
+# Fetch threads per state worker: the primary URL plus the usual two backups
+FETCHES_PER_STATE = 3
+
+# Seconds a state's primary URL has to answer before its backups are requested too
+BACKUP_DELAY = 3.0
+
 class StateWebScraper:
     """Intelligent web scraper that adapts to different state websites"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (compatible; TaxBot/2.0; +https://taxautomation.com/bot)'
-        })
+    def __init__(self, cache_dir: Optional[Path] = HTTP_CACHE_DIR, max_workers: int = MAX_WORKERS):
+        self.cache_dir = cache_dir
+        # One Session per thread (see `session`), so workers keep their own keep-alive
+        # connections instead of contending for a shared pool
+        self._tls = threading.local()
+        # Long-lived fetch threads, so their per-thread sessions are reused across states;
+        # sized so every concurrent state can have all its candidate URLs in flight
+        # when its primary is slow (see scrape_state_content)
+        self._fetch_pool = ThreadPoolExecutor(
+            max_workers=max(1, max_workers) * FETCHES_PER_STATE, thread_name_prefix="scraper"
+        )
+        # Common content selectors as one selector group, so the tree is walked once
+        self._combined_selector = ", ".join(CONTENT_SELECTORS)
+        self._selector_cache: Dict[Tuple[str, ...], str] = {}
+        # Compiled forms for the bs4 path, keyed by selector string
+        self._compiled_selectors: Dict[str, soupsieve.SoupSieve] = {
+            self._combined_selector: soupsieve.compile(self._combined_selector)
+        }
+    
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's Session, created on first use"""
+        session = getattr(self._tls, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (compatible; TaxBot/2.0; +https://taxautomation.com/bot)',
+                'Accept': 'text/html,application/xhtml+xml',
+                'Accept-Encoding': ACCEPT_ENCODING,
+            })
+            # Transient errors are retried with backoff before falling back to backup URLs
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._tls.session = session
+        return session
     
     def scrape_state_content(self, config: StateConfig) -> str:
         """
@@ -286,142 +739,442 @@ class StateWebScraper:
         if config.backup_urls:
             urls_to_try.extend(config.backup_urls)
         
-        for url in urls_to_try:
+        # Backups are requested only if the primary fails or is still pending after
+        # BACKUP_DELAY, so a slow primary does not add its full latency; results
+        # are then taken in priority order and any queued requests are dropped
+        primary = self._fetch_pool.submit(self._fetch, urls_to_try[0], config)
+        futures = [primary]
+        try:
+            checked = 0
+            if wait([primary], timeout=BACKUP_DELAY).done:
+                result = self._parse_response(primary, urls_to_try[0], config)
+                if result is not None:
+                    return result
+                checked = 1
+            futures += [self._fetch_pool.submit(self._fetch, url, config) for url in urls_to_try[1:]]
+            for url, future in list(zip(urls_to_try, futures))[checked:]:
+                result = self._parse_response(future, url, config)
+                if result is not None:
+                    return result
+        finally:
+            for future in futures:
+                future.cancel()
+        
+        return f"[Error] Failed to scrape any URLs for {config.state_name}"
+    
+    def _fetch(self, url: str, config: StateConfig) -> Tuple[bytes, bool]:
+        """
+        GET one candidate URL, raising on HTTP errors
+        
+        With a cache directory, the body and its ETag/Last-Modified headers are
+        kept on disk and sent back as a conditional GET; 304 reuses the cached body.
+        
+        Returns:
+            - bytes: Page body
+            - bool: True if the server answered 304 Not Modified
+        """
+        print(f"[Scraper] Attempting to scrape {config.state_name} from {url}")
+        if self.cache_dir is None:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT, stream=True)
+            response.raise_for_status()
+            return self._read_body(response), False
+        
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        body_file = self.cache_dir / f"{key}.html"
+        meta_file = self.cache_dir / f"{key}.headers.json"
+        
+        headers = {}
+        if body_file.exists() and meta_file.exists():
             try:
-                print(f"[Scraper] Attempting to scrape {config.state_name} from {url}")
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, "html.parser")
-                
-                # Remove unwanted elements
-                for element in soup(["script", "style", "nav", "footer", "header"]):
-                    element.decompose()
-                
-                # Try to find main content area
-                main_content = self._extract_main_content(soup, config)
+                meta = _json_loads(meta_file.read_bytes())
+            except ValueError:
+                meta = {}
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        
+        response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+        if response.status_code == 304:
+            response.close()
+            print(f"[Scraper] {url} not modified, using cached copy")
+            return body_file.read_bytes(), True
+        response.raise_for_status()
+        body = self._read_body(response)
+        
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        body_file.write_bytes(body)
+        meta_file.write_bytes(_json_dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }))
+        return body, False
+    
+    @staticmethod
+    def _read_body(response: requests.Response) -> bytes:
+        """
+        Read a streamed response, stopping once a top-level <main> element has closed
+        
+        Content is the first selector match in document order. Once a <main> directly
+        under <body> has closed, every element that could come before it is complete,
+        so the rest of the page (footers, trailing scripts) is never downloaded.
+        A <main> nested in another container is not a stopping point, since a
+        selector may match that container; such pages are read in full, as are
+        pages without <main>.
+        """
+        parser = etree.HTMLPullParser(events=("end",), tag="main")
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size=16384):
+                chunks.append(chunk)
+                parser.feed(chunk)
+                if any(
+                    all(a.tag in ("body", "html") for a in element.iterancestors())
+                    for _, element in parser.read_events()
+                ):
+                    break
+        finally:
+            response.close()
+        return b"".join(chunks)
+    
+    def _parse_response(self, future: Future, url: str, config: StateConfig) -> Optional[str]:
+        """Turn a fetched page into content for the LLM, or None if this URL failed"""
+        try:
+            content, not_modified = future.result()
+            
+            # An unchanged page gives the same text as last time, so skip parsing it
+            text_file = self._text_cache_file(url, config)
+            if not_modified and text_file is not None and text_file.exists():
+                print(f"[Scraper] Reusing extracted text for {config.state_name}")
+                return text_file.read_text(encoding="utf-8")
+            
+            text = self._extract_text(content, config)
+            if text_file is not None:
+                text_file.write_text(text, encoding="utf-8")
+            return text
                 
-                if main_content:
-                    print(f"[Scraper] Successfully scraped {config.state_name}")
-                    return str(main_content)
-                else:
-                    print(f"[Scraper] Warning: No main content found for {config.state_name}")
-                    return str(soup)
-                    
-            except Exception as e:
-                print(f"[Scraper] Failed to scrape {url}: {e}")
-                continue
+        except Exception as e:
+            print(f"[Scraper] Failed to scrape {url}: {e}")
+            return None
+    
+    def _text_cache_file(self, url: str, config: StateConfig) -> Optional[Path]:
+        """Where the text extracted from `url` is kept (None without a cache directory)"""
+        if self.cache_dir is None:
+            return None
+        # Keyed on everything that changes the extracted text besides the page itself
+        extractors = f"{trafilatura is not None}:{LexborHTMLParser is not None}"
+        key = hashlib.sha1(f"{url}\0{self._content_selector(config)}\0{extractors}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.txt"
+    
+    def _extract_text(self, content: bytes, config: StateConfig) -> str:
+        """Main content text of a page, for the LLM"""
+        # Prefer a main-text extractor: it drops navigation and markup so the
+        # LLM's content budget goes to tax prose and tables
+        if trafilatura is not None:
+            text = trafilatura.extract(
+                content,
+                include_tables=True,
+                include_formatting=False,
+                favor_recall=True,
+            )
+            if text:
+                print(f"[Scraper] Successfully scraped {config.state_name}")
+                return text
         
-        return f"[Error] Failed to scrape any URLs for {config.state_name}"
+        # Lexbor does the same select-and-strip entirely in C; bs4 is the fallback
+        if LexborHTMLParser is not None:
+            text = self._lexbor_text(content, config)
+            if text is not None:
+                print(f"[Scraper] Successfully scraped {config.state_name}")
+                return text
+        
+        # Build only the container subtrees; the full page is parsed only
+        # if none of them holds a content area
+        soup = BeautifulSoup(content, "lxml", parse_only=CONTENT_STRAINER)
+        self._strip_unwanted(soup)
+        main_content = self._extract_main_content(soup, config)
+        if main_content is None:
+            soup = BeautifulSoup(content, "lxml")
+            self._strip_unwanted(soup)
+            main_content = self._extract_main_content(soup, config)
+        
+        # Plain text only: markup would just eat into the LLM's content budget
+        if main_content:
+            print(f"[Scraper] Successfully scraped {config.state_name}")
+            return main_content.get_text(separator="\n", strip=True)
+        else:
+            print(f"[Scraper] Warning: No main content found for {config.state_name}")
+            return soup.get_text(separator="\n", strip=True)
+    
+    @staticmethod
+    def _strip_unwanted(soup: BeautifulSoup):
+        """Remove UNWANTED_TAGS with their contents, before any content area is selected"""
+        for element in soup(UNWANTED_TAGS):
+            element.decompose()
+    
+    def _content_selector(self, config: StateConfig) -> str:
+        """Common content selectors plus the state's own, as one selector group"""
+        extra = tuple(config.fallback_selectors.get("content_area", [])) if config.fallback_selectors else ()
+        selector = self._selector_cache.get(extra)
+        if selector is None:
+            selector = self._combined_selector + (", " + ", ".join(extra) if extra else "")
+            self._selector_cache[extra] = selector
+        return selector
+    
+    def _lexbor_text(self, content: bytes, config: StateConfig) -> Optional[str]:
+        """Main content text via selectolax/Lexbor, or None if the page has no body"""
+        tree = LexborHTMLParser(content)
+        tree.strip_tags(UNWANTED_TAGS)
+        node = tree.css_first(self._content_selector(config)) or tree.body
+        if node is None:
+            return None
+        # Whitespace-only nodes come back empty; drop them to match bs4's get_text
+        return "\n".join(filter(None, node.text(separator="\n", strip=True).split("\n")))
     
     def _extract_main_content(self, soup: BeautifulSoup, config: StateConfig) -> Optional[BeautifulSoup]:
         """
         Intelligently extract the main tax content from the page
         """
-        # Try common content selectors
-        content_selectors = [
-            "main",
-            "[role='main']",
-            ".main-content",
-            ".content",
-            "#content",
-            ".tax-content"
-        ]
-        
-        # Add state-specific selectors if provided
-        if config.fallback_selectors:
-            content_selectors.extend(config.fallback_selectors.get("content_area", []))
-        
-        for selector in content_selectors:
-            content = soup.select_one(selector)
-            if content:
-                return content
+        # First match in document order across all selectors (state-specific ones included)
+        selector = self._content_selector(config)
+        compiled = self._compiled_selectors.get(selector)
+        if compiled is None:
+            compiled = self._compiled_selectors[selector] = soupsieve.compile(selector)
+        content = compiled.select_one(soup)
+        if content:
+            return content
         
         # Fallback: return body content
         return soup.find("body")
 
 # ---------------- Multi-State Controller ----------------
 
+# Summary sheet layout, shared by every export
+_HEADERS = (
+    "State", "State Code", "Nexus Standard", "Effective Date (Nexus)",
+    "Tax Base Summary", "Tax Rates", "Source URL",
+    "Sales Factor Method", "Effective Date (Sales Factor)"
+)
+_LINK_FONT = Font(color="0000FF", underline="single")  # Blue and underlined
+
 class MultiStateTaxExtractor:
     """Main controller for multi-state tax extraction"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_workers: int = MAX_WORKERS,
+                 state_cache_dir: Optional[Path] = STATE_CACHE_DIR, semantic_cache: bool = False):
         self.llm_engine = TaxAnalysisEngine(api_key)
-        self.scraper = StateWebScraper()
+        self.max_workers = max_workers
+        self.scraper = StateWebScraper(max_workers=max_workers)
         self.results = {}
         self.reasoning_log = {}
+        self._lock = threading.Lock()
+        # Last good analysis per state (see _cached_analysis); None disables it
+        self.state_cache = ExtractionCache(state_cache_dir) if state_cache_dir is not None else None
+        # Near-duplicate matching on top of it; costs one embedding call per new page
+        self.semantic_cache = (
+            SemanticCache(ExtractionCache(SEMANTIC_CACHE_DIR), self.llm_engine.embed) if semantic_cache else None
+        )
     
-    def load_state_config(self, config_path: Path) -> StateConfig:
-        """Load state configuration from YAML or JSON file"""
-        with open(config_path, 'r') as f:
-            if config_path.suffix.lower() == '.yaml' or config_path.suffix.lower() == '.yml':
-                data = yaml.safe_load(f)
-            else:
-                data = json.load(f)
+    def load_state_config(self, config_path: Path, mtime_ns: Optional[int] = None) -> StateConfig:
+        """Load state configuration from YAML or JSON file (pass `mtime_ns` if already stat'ed)"""
+        if mtime_ns is None:
+            mtime_ns = config_path.stat().st_mtime_ns
+        data = _load_config_data(str(config_path), mtime_ns)
         
-        return StateConfig(**data)
+        # Fresh copy per call: callers may override fields (e.g. entity_type) on the result
+        return StateConfig(**copy.deepcopy(data))
     
-    def extract_state_taxes(self, config: StateConfig) -> Dict[str, str]:
-        """Extract tax information for a single state"""
+    def _scrape(self, config: StateConfig) -> str:
+        """Fetch one state's page content"""
         print(f"\n[Extractor] Processing {config.state_name}...")
         
         # 1. Scrape website content
-        raw_content = self.scraper.scrape_state_content(config)
-        
-        # 2. Analyze with LLM
-        analysis_result, reasoning = self.llm_engine.analyze_tax_content(
-            raw_content, 
-            config.state_name, 
-            config
-        )
-        
-        # 3. Store results
-        self.results[config.state_code] = {
+        return self.scraper.scrape_state_content(config)
+    
+    @staticmethod
+    def _result_data(config: StateConfig, raw_content: str, analysis_result: Dict[str, str]) -> Dict[str, Any]:
+        """Result record kept per state for export"""
+        return {
             "config": config,
             "analysis": analysis_result,
             "raw_content": raw_content[:1000] + "..." if len(raw_content) > 1000 else raw_content
         }
-        self.reasoning_log[config.state_code] = reasoning
+    
+    def _content_hash(self, config: StateConfig, raw_content: str) -> str:
+        """Hash of everything that shapes a state's analysis (model, business context, page text)"""
+        key = self._context_key(config) + "\0" + raw_content
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _cached_analysis(self, config: StateConfig, content_hash: str,
+                         raw_content: str) -> Optional[Tuple[Dict[str, str], str]]:
+        """Previous analysis for this state if its content hash matches and it is within the TTL"""
+        if self.state_cache is not None:
+            data = self.state_cache.get(config.state_code, max_age=STATE_CACHE_TTL)
+            if data is not None and data.get("hash") == content_hash:
+                print(f"[Extractor] {config.state_code}: content unchanged, reusing previous analysis")
+                return data["analysis"], data["reasoning"]
+        
+        # Same business context required; only the page text may differ
+        if self.semantic_cache is not None:
+            data = self.semantic_cache.get(config.state_code, raw_content)
+            if data is not None and data.get("context") == self._context_key(config):
+                print(f"[Extractor] {config.state_code}: content nearly unchanged, reusing previous analysis")
+                return data["analysis"], data["reasoning"]
+        return None
+    
+    def _context_key(self, config: StateConfig) -> str:
+        """Everything but the page text that shapes an analysis"""
+        return "|".join([self.llm_engine.model_name, config.entity_type, config.industry,
+                         ",".join(config.included_fields or [])])
+    
+    def _remember_analysis(self, config: StateConfig, content_hash: str, raw_content: str,
+                           analysis_result: Dict[str, str], reasoning: str):
+        """Keep a successful analysis for reuse on later runs"""
+        # Only answers worth reusing: parsed JSON that the model was not unsure about
+        if (not analysis_result or "Raw Analysis" in analysis_result
+                or reasoning.endswith("Confidence: low")):
+            return
+        entry = {"hash": content_hash, "analysis": analysis_result, "reasoning": reasoning, "ts": time.time()}
+        if self.state_cache is not None:
+            self.state_cache.put(config.state_code, entry)
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(config.state_code, raw_content, {**entry, "context": self._context_key(config)})
+    
+    def _extract_state(self, config: StateConfig) -> Tuple[str, Dict[str, Any], str]:
+        """Scrape and analyze one state without touching shared state (safe to run in threads)"""
+        raw_content = self._scrape(config)
+        content_hash = self._content_hash(config, raw_content)
+        
+        # 2. Analyze with LLM (skipped when the page text is unchanged since the last good run)
+        cached = self._cached_analysis(config, content_hash, raw_content)
+        if cached is not None:
+            analysis_result, reasoning = cached
+        else:
+            analysis_result, reasoning = self.llm_engine.analyze_tax_content(
+                raw_content, 
+                config.state_name, 
+                config
+            )
+            self._remember_analysis(config, content_hash, raw_content, analysis_result, reasoning)
         
-        return analysis_result
+        return config.state_code, self._result_data(config, raw_content, analysis_result), reasoning
+    
+    def _store(self, state_code: str, result_data: Dict[str, Any], reasoning: str):
+        """Record one state's results"""
+        with self._lock:
+            self.results[state_code] = result_data
+            self.reasoning_log[state_code] = reasoning
+    
+    def extract_state_taxes(self, config: StateConfig) -> Dict[str, str]:
+        """Extract tax information for a single state"""
+        state_code, result_data, reasoning = self._extract_state(config)
+        
+        # 3. Store results
+        self._store(state_code, result_data, reasoning)
+        
+        return result_data["analysis"]
+    
+    def extract_states(self, configs: List[StateConfig]) -> Dict[str, Dict[str, str]]:
+        """
+        Extract several states concurrently
+        
+        Pages are scraped on a thread pool, then analyzed BATCH_SIZE states per
+        LLM request, with several batches in flight at once. Results are stored
+        in the order of `configs` to keep exports stable.
+        """
+        if not configs:
+            return {}
+        
+        raw_contents: Dict[int, str] = {}
+        analyses: Dict[int, Tuple[Dict[str, str], str]] = {}
+        errors: Dict[int, Exception] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(configs)))) as executor:
+            # 1. Scrape every state
+            futures = {executor.submit(self._scrape, c): i for i, c in enumerate(configs)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    raw_contents[index] = future.result()
+                except Exception as e:
+                    print(f"[Extractor] Failed to process {configs[index].state_code}: {e}")
+                    errors[index] = e
+            
+            # 2. Analyze with LLM, several states per request; unchanged pages reuse the last good analysis
+            hashes = {i: self._content_hash(configs[i], raw_contents[i]) for i in raw_contents}
+            pending = []
+            for index in sorted(raw_contents):
+                cached = self._cached_analysis(configs[index], hashes[index], raw_contents[index])
+                if cached is not None:
+                    analyses[index] = cached
+                else:
+                    pending.append(index)
+            batches = [pending[k:k + BATCH_SIZE] for k in range(0, len(pending), BATCH_SIZE)]
+            futures = {
+                executor.submit(
+                    self.llm_engine.analyze_tax_content_batch,
+                    [(raw_contents[i], configs[i].state_name, configs[i]) for i in batch],
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    for index, (analysis_result, reasoning) in zip(batch, future.result()):
+                        analyses[index] = (analysis_result, reasoning)
+                        self._remember_analysis(configs[index], hashes[index], raw_contents[index], analysis_result, reasoning)
+                except Exception as e:
+                    for index in batch:
+                        print(f"[Extractor] Failed to process {configs[index].state_code}: {e}")
+                        errors[index] = e
+        
+        # 3. Store results
+        results = {}
+        for index, config in enumerate(configs):
+            if index in errors:
+                results[config.state_code] = {"error": str(errors[index])}
+                continue
+            analysis_result, reasoning = analyses[index]
+            self._store(config.state_code, self._result_data(config, raw_contents[index], analysis_result), reasoning)
+            results[config.state_code] = analysis_result
+        
+        return results
     
     def process_multiple_states(self, config_dir: Path) -> Dict[str, Dict[str, str]]:
         """Process multiple states from a configuration directory"""
         results = {}
         
-        # Find all config files
-        config_files = list(config_dir.glob("*.yaml")) + list(config_dir.glob("*.yml")) + list(config_dir.glob("*.json"))
+        # Find all config files in one directory pass; DirEntry.stat() reuses the scan's data
+        with os.scandir(config_dir) as it:
+            entries = sorted(
+                (e for e in it if e.is_file() and e.name.endswith((".yaml", ".yml", ".json"))),
+                key=lambda e: e.name
+            )
         
-        for config_file in config_files:
+        configs = []
+        for entry in entries:
+            config_file = Path(entry.path)
             try:
-                state_config = self.load_state_config(config_file)
-                state_results = self.extract_state_taxes(state_config)
-                results[state_config.state_code] = state_results
+                configs.append(self.load_state_config(config_file, entry.stat().st_mtime_ns))
             except Exception as e:
                 print(f"[Extractor] Failed to process {config_file}: {e}")
                 results[config_file.stem] = {"error": str(e)}
         
+        results.update(self.extract_states(configs))
         return results
     
     def export_results(self, output_dir: Path):
         """Export results to Excel and text files"""
         output_dir.mkdir(exist_ok=True)
         
-        # 1. Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Multi-State Tax Summary"
+        # 1. Create Excel workbook (write-only: rows are streamed to the file)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Multi-State Tax Summary")
         
         # Headers
-        headers = [
-            "State", "State Code", "Nexus Standard", "Effective Date (Nexus)",
-            "Tax Base Summary", "Tax Rates", "Source URL",
-            "Sales Factor Method", "Effective Date (Sales Factor)"
-        ]
-        ws.append(headers)
+        ws.append(_HEADERS)
         
         # Data rows
-        row_num = 2  # Start from row 2 (after headers)
         for state_code, result_data in self.results.items():
             config = result_data["config"]
             analysis = result_data["analysis"]
@@ -437,7 +1190,12 @@ class MultiStateTaxExtractor:
             tax_summary = "\n\n".join(summary_parts) if summary_parts else "No applicable rates found"
             
             # Add entity type and industry context
-            context_info = f"\n\n({config.entity_type.replace('_', '-')} in {config.industry})"
+            context_info = f"\n\n({config.entity_display} in {config.industry})"
+            
+            # Source URL (column G) is the only styled cell, as a hyperlink
+            url_cell = WriteOnlyCell(ws, value=config.tax_definitions_url)
+            url_cell.hyperlink = config.tax_definitions_url
+            url_cell.font = _LINK_FONT
             
             row = [
                 config.state_name,
@@ -446,18 +1204,11 @@ class MultiStateTaxExtractor:
                 config.nexus_effective_date,
                 f"{tax_summary} {context_info}",
                 "",  # Tax rates (included in summary)
-                config.tax_definitions_url,
+                url_cell,
                 config.sales_factor_method,
                 config.sales_factor_date
             ]
             ws.append(row)
-            
-            # Add hyperlink to Source URL (column G, index 7)
-            url_cell = ws.cell(row=row_num, column=7)
-            url_cell.hyperlink = config.tax_definitions_url
-            url_cell.font = Font(color="0000FF", underline="single")  # Blue and underlined
-            
-            row_num += 1
         
         # Save Excel
         excel_path = output_dir / f"multi_state_tax_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -466,9 +1217,10 @@ class MultiStateTaxExtractor:
         
         # 2. Save reasoning log
         reasoning_path = output_dir / "multi_state_reasoning_log.txt"
-        with open(reasoning_path, 'w') as f:
-            for state_code, reasoning in self.reasoning_log.items():
-                f.write(f"=== {state_code} ===\n{reasoning}\n\n")
+        reasoning_path.write_text(
+            "".join(f"=== {state_code} ===\n{reasoning}\n\n" for state_code, reasoning in self.reasoning_log.items()),
+            encoding="utf-8"
+        )
         print(f"[Export] Reasoning log saved to {reasoning_path}")
 
 # ---------------- Example Usage ----------------
@@ -540,6 +1292,11 @@ def main():
                        help='Industry type (shipping, manufacturing, retail, etc.)')
     parser.add_argument('--states', nargs='*', default=['NY', 'CA', 'TX', 'FL', 'IL'],
                        help='States to process (default: NY CA TX FL IL)')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                       help=f'States processed concurrently (default: {MAX_WORKERS})')
+    parser.add_argument('--semantic-cache', action='store_true',
+                       help=f'Reuse a previous analysis when a page is reworded but states the same figures '
+                            f'(entries expire after {SEMANTIC_CACHE_TTL // 86400} days, as exact matches do)')
     
     args = parser.parse_args()
     
@@ -557,10 +1314,11 @@ def main():
     output_dir = Path("multi_state_output")
     
     # Initialize extractor
-    extractor = MultiStateTaxExtractor(api_key)
+    extractor = MultiStateTaxExtractor(api_key, max_workers=args.workers, semantic_cache=args.semantic_cache)
     
     # Process specified states only
     results = {}
+    configs = []
     configs_dir = Path("state_configs")
     
     for state_code in args.states:
@@ -571,18 +1329,19 @@ def main():
                 
                 # Override entity type and industry if specified
                 if args.entity_type != 'C_corp' or args.industry != 'shipping':
-                    state_config.entity_type = args.entity_type
-                    state_config.industry = args.industry
+                    # A new config, so __post_init__ re-derives entity_display
+                    state_config = replace(state_config, entity_type=args.entity_type, industry=args.industry)
                     print(f"[Override] {state_code}: Using {args.entity_type} + {args.industry}")
                 
-                state_results = extractor.extract_state_taxes(state_config)
-                results[state_code] = state_results
+                configs.append(state_config)
             except Exception as e:
                 print(f"[Error] Failed to process {state_code}: {e}")
                 results[state_code] = {"error": str(e)}
         else:
             print(f"[Warning] Config file not found for {state_code}: {config_file}")
     
+    results.update(extractor.extract_states(configs))
+    
     # Export results
     extractor.export_results(output_dir)
     